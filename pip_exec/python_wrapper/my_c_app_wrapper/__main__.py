@@ -1,46 +1,20 @@
 import sys
 import os
-import subprocess
-import shutil
-import importlib.resources
+import functools
 
+# Name and expected location of the bundled binary, computed once at import
+_EXE_NAME = "my_c_app_exec" + (".exe" if sys.platform == "win32" else "")
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+@functools.lru_cache(maxsize=1)
 def find_executable():
     """Find the bundled C executable."""
-    # Use importlib.resources for robust path finding within the installed package
-    try:
-        # In Python 3.9+ use files() API correctly - don't use context manager
-        exe_name = "my_c_app_exec" + (".exe" if sys.platform == "win32" else "")
-        # Assuming the binary is in a 'bin' subdirectory within the package
-        pkg_dir = importlib.resources.files("my_c_app_wrapper")
-        exe_path = pkg_dir / "bin" / exe_name
-        if exe_path.is_file():
-            return str(exe_path) # Return path as string
-    except (AttributeError, ImportError):
-        # Fallback for older Python or if files() API fails
-        # This is less robust than importlib.resources.files
-        try:
-            # Find the package path somewhat manually
-            import my_c_app_wrapper
-            base_path = os.path.dirname(my_c_app_wrapper.__file__)
-            exe_name = "my_c_app_exec" + (".exe" if sys.platform == "win32" else "")
-            exe_path = os.path.join(base_path, "bin", exe_name)
-            if os.path.isfile(exe_path):
-                return exe_path
-        except Exception as e:
-            pass # Handle potential errors finding the path
-    
-    # Another fallback method using __file__ directly
-    try:
-        import my_c_app_wrapper
-        base_path = os.path.dirname(os.path.abspath(my_c_app_wrapper.__file__))
-        exe_name = "my_c_app_exec" + (".exe" if sys.platform == "win32" else "")
-        exe_path = os.path.join(base_path, "bin", exe_name)
-        if os.path.isfile(exe_path):
-            return exe_path
-    except Exception as e:
-        pass
-        
-    raise FileNotFoundError("Could not find the bundled C executable.")
+    # The binary is installed in a 'bin' subdirectory next to this module
+    exe_path = os.path.join(_PACKAGE_DIR, "bin", _EXE_NAME)
+    if os.path.isfile(exe_path):
+        return exe_path
+    raise FileNotFoundError(f"Could not find the bundled C executable at {exe_path}.")
 
 
 def main():
@@ -50,21 +24,26 @@ def main():
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
 
-    args = sys.argv[1:] # Get arguments passed to the Python script
-    
-    # Directly execute the C application
-    cmd = [executable_path] + args
-    
-    print(f"Executing: {' '.join(cmd)}")
+    # Reuse argv in place: the C app sees its own path as argv[0] plus our arguments
+    cmd = sys.argv
+    cmd[0] = executable_path
+
+    # Opt-in trace on stderr so the C app's stdout stays clean in pipelines
+    if os.environ.get("MY_C_APP_DEBUG"):
+        sys.stderr.write("Executing: %s\n" % " ".join(cmd))
+        sys.stderr.flush()
+
     try:
-        # Use subprocess.run for better control and error handling
-        result = subprocess.run(cmd, check=False) # check=False to handle non-zero exit codes manually
-        # Exit with the same code as the C executable
-        sys.exit(result.returncode)
-    except Exception as e:
+        if sys.platform == "win32":
+            # Windows has no real exec(); spawn the binary and forward its exit code
+            import subprocess
+            result = subprocess.run(cmd, check=False)
+            sys.exit(result.returncode)
+        # Replace this process with the C executable; nothing below runs on success
+        os.execv(executable_path, cmd)
+    except OSError as e:
         print(f"Failed to execute command: {e}", file=sys.stderr)
         sys.exit(1)
 
 if __name__ == "__main__":
     main()
-
@@ -1,6 +1,7 @@
 import os
 import sys
 import logging
+import shlex
 import subprocess
 
 # Update logging configuration to use environment variable
@@ -16,19 +17,26 @@ log = logging.getLogger(__name__)
 ZIG_VERSION = "0.14.0" # Example version, choose a recent stable one
 CMAKE_VERSION = "3.27.7" # Example version
 BUILD_DIR = "build_c"
-INSTALL_DIR = os.path.abspath("c_install") # Absolute path for CMake install prefix
 SCRIPT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "../..", "build_c_app.sh"))
+_script_ready = False # Set once the build script is known to be executable
 
 # --- Build Function ---
+def _install_dir():
+    """Absolute CMake install prefix, resolved against the CWD at build time."""
+    return os.path.abspath("c_install")
+
 def build_c_project(package_dir):
     """Builds the C project by calling the bash script."""
     log.info("Starting C project build process...")
-    log.debug(f"Package directory: {package_dir}")
+    log.debug("Package directory: %s", package_dir)
     
-    # Make sure the script is executable
-    if not os.access(SCRIPT_PATH, os.X_OK):
-        log.debug(f"Making script executable: {SCRIPT_PATH}")
-        os.chmod(SCRIPT_PATH, 0o755)
+    # Make sure the script is executable (checked once per process)
+    global _script_ready
+    if not _script_ready:
+        if not os.access(SCRIPT_PATH, os.X_OK):
+            log.debug("Making script executable: %s", SCRIPT_PATH)
+            os.chmod(SCRIPT_PATH, 0o755)
+        _script_ready = True
     
     # Target directory for the final executable
     target_dir = os.path.join(package_dir, "my_c_app_wrapper", "bin")
@@ -39,42 +47,44 @@ def build_c_project(package_dir):
         "--zig-version", ZIG_VERSION,
         "--cmake-version", CMAKE_VERSION,
         "--build-dir", BUILD_DIR,
-        "--install-dir", INSTALL_DIR,
+        "--install-dir", _install_dir(),
         "--source-dir", os.path.abspath("../src"),
         "--target-dir", target_dir,
     ]
     
+    # Debug logging decides verbosity, command tracing and output capture alike
+    _debug = log.isEnabledFor(logging.DEBUG)
+
     # Add verbose flag if log level is DEBUG
-    if log_level.upper() == "DEBUG":
+    if _debug:
         cmd.append("--verbose")
-    
-    log.debug(f"Running command: {' '.join(cmd)}")
+        log.debug("Running command: %s", shlex.join(cmd))
     
     try:
-        # Run the script
-        env = os.environ.copy()
-        # Use subprocess.run to capture output
+        # Run the script; it inherits our environment, and gets no stdin so it can't block on a tty
         result = subprocess.run(
             cmd,
-            env=env,
-            capture_output=True, # Capture stdout and stderr
+            stdin=subprocess.DEVNULL,
+            capture_output=_debug, # Capture only when it will be logged; otherwise stream to the terminal
             text=True # Decode output as text
         )
         
         # Log stdout/stderr regardless of success if debugging
-        if result.stdout:
-            log.debug("Build script stdout:\n%s", result.stdout)
-        if result.stderr:
-            log.debug("Build script stderr:\n%s", result.stderr)
+        if _debug:
+            if result.stdout:
+                log.debug("Build script stdout:\n%s", result.stdout)
+            if result.stderr:
+                log.debug("Build script stderr:\n%s", result.stderr)
 
         # Check return code manually
         if result.returncode != 0:
             log.error(f"Build script failed with code {result.returncode}")
-            # Print captured output on error
-            if result.stdout:
-                log.error("Build script stdout:\n%s", result.stdout)
-            if result.stderr:
-                log.error("Build script stderr:\n%s", result.stderr)
+            # Print captured output on error (already streamed to the terminal otherwise)
+            if _debug:
+                if result.stdout:
+                    log.error("Build script stdout:\n%s", result.stdout)
+                if result.stderr:
+                    log.error("Build script stderr:\n%s", result.stderr)
             # Raise an exception to signal failure
             raise subprocess.CalledProcessError(result.returncode, cmd, output=result.stdout, stderr=result.stderr)
         
@@ -22,9 +22,7 @@ class build_py(_build_py):
     """Custom build command to compile C code before Python build."""
     def run(self):
         """Run the build process."""
-        # First, ensure Python package build structure exists
-        self.run_command('egg_info')
-        
+        # egg_info is already run by setuptools' own command chain
         # Build the C project
         print(f"--- Running custom C build for target directory: {self.build_lib} ---")
         build_c_project(self.build_lib)
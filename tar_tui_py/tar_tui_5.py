@@ -3,12 +3,17 @@
 import curses
 import os
 import sys
+import stat
 import subprocess
+import traceback
+import termios
+import tty
 import argparse
 from pathlib import Path
 import shlex # For safer command display
 import tempfile # For patch generation
 import shutil # For copying files
+from concurrent.futures import ThreadPoolExecutor # For parallel patch staging
 
 # --- Configuration ---
 DEFAULT_START_DIR = "."
@@ -19,28 +24,129 @@ SELECTION_MARKERS = {
 }
 DEFAULT_ARCHIVE_BASE_NAME = "archive" # Used for default filenames
 
+# --- Helpers ---
+def _compressor_args(format_type, max_compress=False):
+    """Return tar options selecting a (multithreaded where available) compressor."""
+    if format_type == 'zst':
+        # -T0: one zstd worker per core
+        if not shutil.which('zstd'):
+            return ['--zstd']
+        if max_compress:
+            # 128 MiB long-distance window catches duplicates across files; costs ~256 MB RAM per worker.
+            # windowLog 27 is still within zstd's default decompression limit, so plain `zstd -d` or `tar -x` read it
+            return ['--use-compress-program=zstd -T0 --long=27 -19']
+        return ['--use-compress-program=zstd -T0']
+    if format_type == 'gz':
+        # pigz is a parallel drop-in for gzip
+        return ['--use-compress-program=pigz'] if shutil.which('pigz') else ['-z']
+    return []
+
+
+def _wait_for_key(prompt):
+    """Show prompt and wait for a single keypress (a line when stdin is not a terminal)."""
+    sys.stdout.write(prompt)
+    sys.stdout.flush()
+    fd = sys.stdin.fileno()
+    try:
+        old_attrs = termios.tcgetattr(fd)
+    except termios.error:
+        sys.stdin.readline()
+        return
+    try:
+        tty.setraw(fd)
+        os.read(fd, 32) # Whole escape sequence for arrow/function keys, not just ESC
+    finally:
+        termios.tcsetattr(fd, termios.TCSADRAIN, old_attrs)
+    sys.stdout.write("\n")
+
+
+def _fast_copy(src_path, dest_path):
+    """Copy file contents in-kernel with copy_file_range (a reflink on CoW filesystems); keep the mode bits."""
+    copy_file_range = getattr(os, 'copy_file_range', None) # Linux, Python 3.8+
+    if copy_file_range is None:
+        shutil.copy2(src_path, dest_path)
+        return
+    try:
+        with open(src_path, 'rb') as fsrc, open(dest_path, 'wb') as fdst:
+            while copy_file_range(fsrc.fileno(), fdst.fileno(), 1 << 30):
+                pass
+    except OSError:
+        # Kernel or filesystem without copy_file_range support (e.g. cross-device on old kernels)
+        shutil.copy2(src_path, dest_path)
+        return
+    shutil.copymode(src_path, dest_path) # git diff reports the executable bit
+
+
+def _staging_parent(src_dir, needed):
+    """Pick where the patch staging dir goes: None (default TMPDIR) or RAM-backed /dev/shm.
+       needed is the total size in bytes of the files to stage.
+    """
+    shm = '/dev/shm'
+    try:
+        src_dev = os.stat(src_dir).st_dev
+        # Same device as the sources: staging is hardlinks only, nothing to gain from tmpfs
+        if os.stat(tempfile.gettempdir()).st_dev == src_dev or not os.path.isdir(shm):
+            return None
+        if os.stat(shm).st_dev == src_dev:
+            return shm
+        return shm if shutil.disk_usage(shm).free > needed else None
+    except OSError:
+        return None
+
+
 # --- Data Structure ---
 class TreeNode:
     """Represents a file or directory in the tree."""
-    def __init__(self, path, parent=None, include_parent_path=False):
-        self.path = Path(path).resolve() # Store absolute path for reliable checks
+    # Fixed attribute layout: no per-node __dict__ for large trees
+    __slots__ = ('path_str', 'parent', 'is_dir', 'children', 'children_loaded',
+                 'selected', 'expanded', 'error', 'include_parent_path', 'initial_cwd', 'name', 'depth', 'rel_path_str',
+                 'selected_files', '_num_selected', '_num_partial', '_num_valid_children')
+
+    def __init__(self, path, parent=None, include_parent_path=False, is_dir=None, resolved=False, initial_cwd=None):
+        # Store absolute path as a plain string for reliable checks;
+        # children built from a resolved parent are already absolute
+        self.path_str = path if resolved else str(Path(path).resolve())
         self.parent = parent
-        self.is_dir = self.path.is_dir()
+        self.depth = parent.depth + 1 if parent is not None else 0 # Indentation level below the root
+        # Path relative to the tree root as a plain string, built once from the parent's
+        if parent is None:
+            self.rel_path_str = "."
+        elif parent.parent is None:
+            self.rel_path_str = os.path.basename(self.path_str)
+        else:
+            self.rel_path_str = parent.rel_path_str + os.sep + os.path.basename(self.path_str)
+        # Callers that already know the type (e.g. from os.scandir) pass it to skip a stat
+        self.is_dir = os.path.isdir(self.path_str) if is_dir is None else is_dir
         self.children = []
         self.children_loaded = False
         self.selected = 0  # 0: None, 1: Selected, 2: Partial
         self.expanded = False
         self.error = None # Store potential permission errors
+        # Child counters kept up to date on every change, so parent state is O(1) to derive
+        self._num_selected = 0
+        self._num_partial = 0
+        self._num_valid_children = 0 # Count only non-error children
         self.include_parent_path = include_parent_path # For display name format
+        # CWD the script was launched from, captured once and shared down the tree
+        if initial_cwd is None:
+            initial_cwd = parent.initial_cwd if parent is not None else Path.cwd()
+        self.initial_cwd = initial_cwd
+        # Selected, loadable files of the whole tree (insertion-ordered dict used as a set), shared by all nodes
+        self.selected_files = parent.selected_files if parent is not None else {}
+        self.name = self._display_name() # Computed once; drawn every frame
 
     @property
-    def name(self):
+    def path(self):
+        """Absolute path as a Path, for the few places that need pathlib semantics."""
+        return Path(self.path_str)
+
+    def _display_name(self):
         """Return the display name based on include_parent_path flag."""
         if self.include_parent_path or self.parent is None:
             # Use path relative to the initial CWD for root nodes or when -f is used
             try:
                 # Ensure relative path starts from the initial CWD where script was run
-                return f"./{self.path.relative_to(Path.cwd())}"
+                return f"./{self.path.relative_to(self.initial_cwd)}"
             except ValueError:
                  # Handle cases where the path is not relative to CWD (e.g., absolute paths given)
                  # Use path relative to the closest parent directory if possible, or absolute
@@ -56,47 +162,74 @@ class TreeNode:
 
         else:
              # Use just the basename when -f is not used and it's a child node
-             return self.path.name
+             return os.path.basename(self.path_str)
 
     def load_children(self):
         """Load immediate children of this directory node."""
         if not self.is_dir or self.children_loaded:
             return
         self.children = []
-        self.error = None
+        self._num_selected = self._num_partial = self._num_valid_children = 0
+        self._set_error(None)
         try:
-            # Listdir and create nodes, handling potential errors
-            items = sorted(list(self.path.iterdir()), key=lambda p: (not p.is_dir(), p.name.lower()))
-            for item_path in items:
-                try:
-                    # Check readability before creating node
-                    # is_dir() might raise PermissionError
-                    is_item_dir = item_path.is_dir()
-                    child_node = TreeNode(item_path, parent=self, include_parent_path=self.include_parent_path)
-                    self.children.append(child_node)
-                except PermissionError:
-                     # Create a node indicating the error
-                     error_node = TreeNode(item_path, parent=self, include_parent_path=self.include_parent_path)
-                     error_node.error = "Permission Denied"
-                     # Try to determine if it was a directory or file, might fail again
-                     try: error_node.is_dir = item_path.is_dir()
-                     except PermissionError: error_node.is_dir = False # Guess file
-                     self.children.append(error_node)
-                except OSError as e:
-                     error_node = TreeNode(item_path, parent=self, include_parent_path=self.include_parent_path)
-                     error_node.error = f"OS Error: {e.strerror}"
-                     try: error_node.is_dir = item_path.is_dir()
-                     except OSError: error_node.is_dir = False # Guess file
-                     self.children.append(error_node)
+            # Scan once with os.scandir; DirEntry caches the file type from the directory read
+            entries = []
+            with os.scandir(self.path_str) as it:
+                for entry in it:
+                    try:
+                        entry_is_dir = entry.is_dir()
+                        error = None
+                    except PermissionError:
+                        # Guess file if the type can't be determined
+                        entry_is_dir, error = False, "Permission Denied"
+                    except OSError as e:
+                        entry_is_dir, error = False, f"OS Error: {e.strerror}"
+                    entries.append((entry_is_dir, entry, error))
+            entries.sort(key=lambda e: (not e[0], e[1].name.lower()))
+
+            for is_item_dir, entry, error in entries:
+                # entry.path is already os.path.join(self.path_str, entry.name)
+                child_node = TreeNode(entry.path, parent=self, include_parent_path=self.include_parent_path,
+                                      is_dir=is_item_dir, resolved=True)
+                child_node.error = error
+                self.children.append(child_node)
+                if not error:
+                    self._num_valid_children += 1 # New children start unselected
 
             self.children_loaded = True
         except PermissionError:
-            self.error = "Cannot list directory: Permission Denied"
+            self._set_error("Cannot list directory: Permission Denied")
             self.children_loaded = False # Indicate loading failed
         except OSError as e:
-            self.error = f"Cannot list directory: {e.strerror}"
+            self._set_error(f"Cannot list directory: {e.strerror}")
             self.children_loaded = False
 
+    def _set_error(self, error):
+        """Set the error flag; error nodes don't count towards the parent's selection state."""
+        was_valid = not self.error
+        self.error = error
+        if self.parent is not None and was_valid != (not error):
+            delta = -1 if was_valid else 1
+            self.parent._num_valid_children += delta
+            self.parent._count_child_state(self.selected, delta)
+
+    def _set_selected(self, state):
+        """Set selection state, keeping the parent's child counters in step."""
+        old_state = self.selected
+        if state == old_state:
+            return
+        self.selected = state
+        if self.parent is not None and not self.error:
+            self.parent._count_child_state(old_state, -1)
+            self.parent._count_child_state(state, 1)
+
+    def _count_child_state(self, state, delta):
+        """Adjust the counter for a valid child in the given selection state."""
+        if state == 1:
+            self._num_selected += delta
+        elif state == 2:
+            self._num_partial += delta
+
     def toggle_selection(self):
         """Toggle selection state (0 -> 1, 1 -> 0)."""
         if self.error: return # Cannot select error nodes
@@ -108,139 +241,113 @@ class TreeNode:
             self.parent.update_selection_state()
 
     def _set_selection_recursive(self, state):
-        """Recursively set selection state for node and children."""
-        self.selected = state
-        if self.is_dir:
-            # If collapsing selection (state=0), no need to load children
-            # If expanding selection (state=1), load children if not already loaded
-            if state == 1 and not self.children_loaded:
-                self.load_children()
-            # Only recurse if children are loaded (or just loaded)
-            if self.children_loaded:
-                 for child in self.children:
-                     if not child.error: # Don't try to select error nodes
-                         child._set_selection_recursive(state)
+        """Set selection state for node and all descendants (explicit stack, no recursion)."""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            node._set_selected(state)
+            if not node.is_dir:
+                # Keep the tree-wide selection in step so archiving doesn't need a full walk
+                if state == 1:
+                    node.selected_files[node] = None
+                else:
+                    node.selected_files.pop(node, None)
+            else:
+                # If collapsing selection (state=0), no need to load children
+                # If expanding selection (state=1), load children if not already loaded
+                if state == 1 and not node.children_loaded:
+                    node.load_children()
+                # Only descend if children are loaded (or just loaded)
+                if node.children_loaded:
+                    # Don't try to select error nodes; push in reverse so files are recorded in tree order
+                    stack.extend(reversed([child for child in node.children if not child.error]))
 
     def update_selection_state(self):
-        """Update parent's selection state based on children."""
+        """Update selection state based on children, propagating up through parents."""
+        node = self
+        while node is not None and node._refresh_selection_state():
+            node = node.parent
+
+    def _refresh_selection_state(self):
+        """Recompute this directory's state from its children. Returns True if it changed."""
         if not self.is_dir:
-            return
+            return False
 
         # Only update if children are loaded, otherwise keep explicit state
         if not self.children_loaded:
             # If node is marked selected (1), but children aren't loaded,
             # it implies a direct selection of the dir. Keep it as 1.
             # If it's 0 or 2, and children aren't loaded, state is indeterminate/explicit. Keep it.
-            return
+            return False
 
         if not self.children: # Empty directory
              # Keep explicit selection (0 or 1), don't force to 0 or 2
              # If it was explicitly selected (1), keep it 1. If not (0), keep it 0.
-             return
-
-        num_selected = 0
-        num_partial = 0
-        num_children_valid = 0 # Count only non-error children
+             return False
 
-        for child in self.children:
-            if not child.error:
-                num_children_valid += 1
-                if child.selected == 1:
-                    num_selected += 1
-                elif child.selected == 2:
-                    num_partial += 1
+        # Derived from counters maintained by the children, no rescan needed
+        num_selected = self._num_selected
+        num_partial = self._num_partial
+        num_children_valid = self._num_valid_children
 
-        old_state = self.selected
+        old_state = new_state = self.selected
 
         if num_children_valid == 0: # All children have errors or dir is empty (handled above)
             # Keep explicitly selected state (1). If not explicitly selected (0 or 2), mark as 0.
-            if self.selected != 1: self.selected = 0
+            if self.selected != 1: new_state = 0
              # Do not change state to partial if only error children exist
         elif num_selected == 0 and num_partial == 0:
-            self.selected = 0 # All valid children deselected
+            new_state = 0 # All valid children deselected
         elif num_selected == num_children_valid and num_partial == 0:
              # Only fully selected if *all* valid children are fully selected
-             self.selected = 1
+             new_state = 1
         else:
-            self.selected = 2 # Partial selection among valid children
+            new_state = 2 # Partial selection among valid children
+        self._set_selected(new_state)
 
-        # Propagate change upwards if state changed
-        if self.parent and self.selected != old_state:
-            self.parent.update_selection_state()
+        # Caller propagates upwards if state changed
+        return new_state != old_state
 
     def get_visible_nodes(self):
         """Return a flat list of nodes currently visible in the TUI."""
-        nodes = [self]
-        if self.is_dir and self.expanded:
-            if not self.children_loaded:
-                self.load_children() # Load on demand when expanding visually
-            for child in self.children:
-                # Recursively get nodes from children that are also expanded
-                nodes.extend(child.get_visible_nodes())
+        nodes = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            nodes.append(node)
+            if node.is_dir and node.expanded:
+                if not node.children_loaded:
+                    node.load_children() # Load on demand when expanding visually
+                # Push in reverse so children pop off in display order
+                stack.extend(reversed(node.children))
         return nodes
 
-    def get_selected_paths(self, initial_base_path):
-        """Return a list of paths for selected files relative to initial_base_path.
-           Directories that are fully selected mean all contents *currently loadable*
-           are included recursively. Partial directories mean recurse deeper.
-           Returns only *file* paths relative to initial_base_path.
-        """
-        selected_file_paths = []
-
-        # Base case: Node is a file
-        if not self.is_dir:
-            if self.selected == 1 and not self.error:
-                try:
-                    # Ensure path is relative to the initial directory the TUI was started in
-                    rel_path = self.path.relative_to(initial_base_path)
-                    selected_file_paths.append(str(rel_path))
-                except ValueError:
-                    # Path is outside the initial base path - skip it for relative archive operations
-                    pass # Or log a warning: print(f"Warning: Skipping selected file outside base path: {self.path}")
-            return selected_file_paths # Return list containing the file path or empty list
-
-        # Recursive case: Node is a directory
-        if self.is_dir and not self.error:
-            # If directory is selected (partially or fully), we need to check its children
-            if self.selected in [1, 2]:
-                # Ensure children are loaded to make decisions
-                if not self.children_loaded:
-                    self.load_children()
-
-                # If fully selected (1), conceptually all children are selected
-                # If partially selected (2), some children/grandchildren are selected
-                # In both cases, we recurse into children
-                for child in self.children:
-                    # If the parent dir is fully selected (1), treat the child as selected (if not an error node)
-                    # unless the child itself was later deselected (making parent partial '2').
-                    # But the get_selected_paths logic works recursively, so we just call it on children.
-                    # If parent is state 1, child will be state 1 (unless error).
-                    # If parent is state 2, child state could be 0, 1, or 2.
-                    # If parent is state 0, child state must be 0.
-                    # The recursive call handles this correctly.
-                    selected_file_paths.extend(child.get_selected_paths(initial_base_path))
-
-        return selected_file_paths
-
 
 # --- TUI Application ---
 class TarTUI:
-    def __init__(self, stdscr, start_path, include_parent_path):
+    def __init__(self, stdscr, start_path, include_parent_path, verbose=False, max_compress=False):
         self.stdscr = stdscr
         self.start_path = Path(start_path).resolve() # Absolute path of start dir
         self.initial_cwd = Path.cwd() # CWD when script was launched
         self.include_parent_path = include_parent_path
+        self.verbose = verbose # Show tar's file listing when archiving
+        self.max_compress = max_compress # zstd -19 with a long window for .tar.zst
+        self._prefix_cache = {} # (depth, selected, is_dir, expanded) -> prefix string
 
         # Ensure start path exists and is a directory
         if not self.start_path.is_dir():
              raise ValueError(f"Error: Starting path '{start_path}' is not a valid directory.")
 
-        self.root_node = TreeNode(self.start_path, include_parent_path=self.include_parent_path)
+        # start_path is already resolved above; don't resolve the root a second time
+        self.root_node = TreeNode(str(self.start_path), include_parent_path=self.include_parent_path,
+                                  resolved=True, initial_cwd=self.initial_cwd)
         # Expand the root node initially to show its contents
         self.root_node.expanded = True
         self.root_node.load_children() # Load first level
 
         self.visible_nodes = []
+        self._visible_index = {} # node -> position in visible_nodes, rebuilt with the list
+        self._visible_nodes_dirty = True # Set when expand/collapse changes the tree shape
         self.selected_line = 0
         self.top_line = 0 # For scrolling
         self.status = "Navigate: Arrows | Select: Space | Expand/Collapse: Enter/Right/Left | Archive/Patch: T G Z P | Quit: Q"
@@ -249,9 +356,13 @@ class TarTUI:
 
     def _update_visible_nodes(self):
         """Update the flat list of nodes currently visible."""
-        # The root node itself might be displayed depending on structure.
-        # get_visible_nodes starts from the node it's called on.
-        self.visible_nodes = self.root_node.get_visible_nodes()
+        # Only rebuild when the tree shape changed; selection changes keep the same list
+        if self._visible_nodes_dirty:
+            # The root node itself might be displayed depending on structure.
+            # get_visible_nodes starts from the node it's called on.
+            self.visible_nodes = self.root_node.get_visible_nodes()
+            self._visible_index = {node: i for i, node in enumerate(self.visible_nodes)}
+            self._visible_nodes_dirty = False
 
         # Ensure selected line stays within bounds
         if not self.visible_nodes:
@@ -266,6 +377,8 @@ class TarTUI:
         """Main application loop."""
         curses.curs_set(0)  # Hide cursor
         self.stdscr.keypad(True) # Enable special keys (arrows)
+        self.stdscr.leaveok(True) # Cursor is hidden; don't spend output repositioning it
+        curses.def_prog_mode() # Save terminal state to restore after running external commands
 
         while True:
             self.draw()
@@ -290,12 +403,9 @@ class TarTUI:
             elif key == ord(' '):
                 current_node = self.get_current_node()
                 if current_node:
-                    current_node.toggle_selection()
-                    # Update parent state upwards directly after toggle
-                    if current_node.parent:
-                         current_node.parent.update_selection_state()
-                    # Need to update visible nodes because selection markers change
-                    self._update_visible_nodes() # Recalculate visible nodes and adjust view
+                    current_node.toggle_selection() # Also updates parent states upwards
+                    # Visible list is unchanged; markers are redrawn from node state
+                    self._update_visible_nodes() # Adjust view
                     action_taken = True # Redraw needed
 
             elif key in [ord('t'), ord('T')]:
@@ -338,19 +448,17 @@ class TarTUI:
                 node.expanded = True
                 if not node.children_loaded:
                     node.load_children() # Load children on demand
+                self._visible_nodes_dirty = True
                 self._update_visible_nodes() # Update list as children are now visible
                 return True # View changed
             # Optional: If already expanded and has children, move selection to first child?
             elif node.children:
-               first_child_node = next((child for child in node.children if child in self.visible_nodes), None)
-               if first_child_node:
-                   try:
-                       first_child_index = self.visible_nodes.index(first_child_node)
-                       if self.selected_line != first_child_index:
-                           self.selected_line = first_child_index
-                           self._adjust_scroll()
-                           return True # Selection moved, redraw needed
-                   except ValueError: pass # Should not happen if first_child_node is from visible_nodes
+               first_child_index = next((self._visible_index[child] for child in node.children
+                                         if child in self._visible_index), None)
+               if first_child_index is not None and self.selected_line != first_child_index:
+                   self.selected_line = first_child_index
+                   self._adjust_scroll()
+                   return True # Selection moved, redraw needed
         return False # No change in expansion state or failed navigation
 
 
@@ -361,38 +469,29 @@ class TarTUI:
             # If the current node is expanded, collapse it first.
             if node.is_dir and node.expanded:
                 node.expanded = False
+                self._visible_nodes_dirty = True
                 # Adjust selection to stay on the collapsed node
-                try:
-                     # We need to recalculate visible nodes first
-                     self._update_visible_nodes()
-                     # Now find the node in the new list
-                     self.selected_line = self.visible_nodes.index(node)
-                     self._adjust_scroll()
-                except ValueError:
-                     # Fallback: if node disappears (e.g. root?), select parent or 0
-                     parent = node.parent
-                     if parent:
-                          try:
-                               self.selected_line = self.visible_nodes.index(parent)
-                          except ValueError: self.selected_line = 0 # Failsafe
-                     else:
-                          self.selected_line = 0
-                     self._adjust_scroll()
+                # We need to recalculate visible nodes first
+                self._update_visible_nodes()
+                # Now find the node in the new list
+                node_index = self._visible_index.get(node)
+                if node_index is None:
+                     # Fallback: if node disappears (e.g. root?), select parent or 0 (failsafe)
+                     node_index = self._visible_index.get(node.parent, 0)
+                self.selected_line = node_index
+                self._adjust_scroll()
                 return True # View structure changed
 
             # If not expanded (or not a dir), try moving to the parent.
             elif node.parent:
-                 try:
-                     # Find parent in the current visible list and select it
-                     # No need to update visible nodes list just for moving selection
-                     parent_index = self.visible_nodes.index(node.parent)
-                     if self.selected_line != parent_index: # Only move if not already on parent
-                         self.selected_line = parent_index
-                         self._adjust_scroll()
-                         return True # Selection moved, redraw needed.
-                 except ValueError:
-                      # Parent might not be visible (e.g. if root is collapsed?)
-                       pass
+                 # Find parent in the current visible list and select it
+                 # No need to update visible nodes list just for moving selection
+                 parent_index = self._visible_index.get(node.parent)
+                 # Parent might not be visible (e.g. if root is collapsed?)
+                 if parent_index is not None and self.selected_line != parent_index: # Only move if not already on parent
+                     self.selected_line = parent_index
+                     self._adjust_scroll()
+                     return True # Selection moved, redraw needed.
         return False # No change
 
     def _adjust_scroll(self):
@@ -414,73 +513,71 @@ class TarTUI:
 
     def get_node_display_prefix(self, node):
         """ Get the indentation and selection marker. """
-        depth = 0
-        temp_node = node
-        # Count parents until we reach the initial root_node or None
-        while temp_node.parent is not None and temp_node != self.root_node:
-             depth += 1
-             temp_node = temp_node.parent
-        # If the node *is* the root node, depth is -1, adjust to 0 for display
-        if node == self.root_node:
-            depth = 0 # Root node itself has 0 indentation if displayed
-
-        indent = "  " * depth
-        marker = SELECTION_MARKERS.get(node.selected, "[?]")
-        # Arrow logic: -> expanded dir, > collapsed dir, ' ' file
-        arrow = "->" if node.is_dir and node.expanded else " >" if node.is_dir else "  "
-        return f"{indent}{marker}{arrow} "
+        # Only a few distinct prefixes exist, so build each one once
+        key = (node.depth, node.selected, node.is_dir, node.is_dir and node.expanded)
+        prefix = self._prefix_cache.get(key)
+        if prefix is None:
+            # Root node itself has 0 indentation; depth is fixed when the node is created
+            indent = "  " * node.depth
+            marker = SELECTION_MARKERS.get(node.selected, "[?]")
+            # Arrow logic: -> expanded dir, > collapsed dir, ' ' file
+            arrow = "->" if node.is_dir and node.expanded else " >" if node.is_dir else "  "
+            prefix = self._prefix_cache[key] = f"{indent}{marker}{arrow} "
+        return prefix
 
 
     def draw(self):
         """Draw the TUI screen."""
-        self.stdscr.clear()
-        max_y, max_x = self.stdscr.getmaxyx()
+        stdscr = self.stdscr
+        # erase() rather than clear(): clear() forces a full repaint, erase() lets curses send only the diff
+        stdscr.erase()
+        max_y, max_x = stdscr.getmaxyx()
         if max_y <= 1: return # Need at least 2 lines for content + status
 
         display_height = max_y - 1 # Reserve bottom line for status
 
-        # Draw tree structure
-        start_index = self.top_line
-        end_index = self.top_line + display_height
-        nodes_to_draw = self.visible_nodes[start_index:end_index]
+        # Bind hot lookups to locals for the per-line loop
+        addstr = stdscr.addstr
+        get_prefix = self.get_node_display_prefix
+        A_NORMAL = curses.A_NORMAL
+        A_REVERSE = curses.A_REVERSE
+        blank = " " * max_x # Sliced for padding instead of building a new string per line
+        top = self.top_line
+        selected_y = self.selected_line - top # Screen row of the highlighted line
 
-        for i, node in enumerate(nodes_to_draw):
-            line_num_in_visible = self.top_line + i # Index in self.visible_nodes
-            draw_y = i # Line number on screen (0 to display_height - 1)
+        # Draw tree structure
+        nodes_to_draw = self.visible_nodes[top:top + display_height]
 
-            prefix = self.get_node_display_prefix(node)
-            display_name = node.name
-            suffix = ""
+        for draw_y, node in enumerate(nodes_to_draw): # Line number on screen (0 to display_height - 1)
+            prefix = get_prefix(node)
             error_msg = f" ({node.error})" if node.error else ""
 
-            line_text = f"{prefix}{display_name}{suffix}{error_msg}"
+            line_text = f"{prefix}{node.name}{error_msg}"
 
             # Ensure we don't try writing past the screen width
             # Truncate intelligently if possible, or just cut
             if len(line_text) >= max_x:
                 line_text = line_text[:max_x-1] + "…"
 
+            # Highlight selected line
+            attr = A_REVERSE if draw_y == selected_y else A_NORMAL
             try:
-                attr = curses.A_NORMAL
-                if line_num_in_visible == self.selected_line:
-                    attr = curses.A_REVERSE # Highlight selected line
-
-                self.stdscr.addstr(draw_y, 0, line_text, attr)
+                addstr(draw_y, 0, line_text, attr)
                 # Clear the rest of the line if highlighted
-                if attr == curses.A_REVERSE:
+                if attr == A_REVERSE:
                     remaining_width = max_x - len(line_text)
                     if remaining_width > 0:
-                        self.stdscr.addstr(draw_y, len(line_text), " " * remaining_width, attr)
+                        addstr(draw_y, len(line_text), blank[:remaining_width], attr)
 
             except curses.error:
                  # Fallback if addstr fails (e.g., strange character width issues)
                  try:
                       safe_text = line_text[:max_x] # Simple safe clip
-                      self.stdscr.addstr(draw_y, 0, safe_text, attr)
-                      if attr == curses.A_REVERSE: # Clear rest of line
+                      addstr(draw_y, 0, safe_text, attr)
+                      if attr == A_REVERSE: # Clear rest of line
                            remaining_width = max_x - len(safe_text)
                            if remaining_width > 0:
-                               self.stdscr.addstr(draw_y, len(safe_text), " " * remaining_width, attr)
+                               addstr(draw_y, len(safe_text), blank[:remaining_width], attr)
                  except curses.error:
                       pass # Give up drawing this line if it consistently fails
 
@@ -488,19 +585,22 @@ class TarTUI:
         # Draw status bar
         status_text = self.status[:max_x]
         try:
-            self.stdscr.addstr(max_y - 1, 0, status_text, curses.A_REVERSE)
+            addstr(max_y - 1, 0, status_text, A_REVERSE)
             # Clear rest of status line
             remaining_width = max_x - len(status_text)
             if remaining_width > 0:
-                 self.stdscr.addstr(max_y - 1, len(status_text), " " * remaining_width, curses.A_REVERSE)
+                 addstr(max_y - 1, len(status_text), blank[:remaining_width], A_REVERSE)
         except curses.error:
             pass
 
-        self.stdscr.refresh()
+        # Batch into a single terminal update
+        stdscr.noutrefresh()
+        curses.doupdate()
 
 
     def _get_output_filename(self, default_filename):
         """Temporarily exit curses to get filename input, providing a default."""
+        self.stdscr.leaveok(False) # The cursor is visible while typing; keep it on the echoed input
         curses.curs_set(1)
         curses.echo()
         curses.nocbreak()
@@ -528,6 +628,7 @@ class TarTUI:
         curses.noecho()
         curses.cbreak()
         self.stdscr.keypad(True)
+        self.stdscr.leaveok(True)
         curses.curs_set(0)
 
         if not filename:
@@ -538,10 +639,30 @@ class TarTUI:
             return filename
 
 
+    def _restore_curses(self):
+        """Return to curses mode after running an external command."""
+        try:
+            # Fast path: the state saved by def_prog_mode (no initscr/terminfo reload)
+            curses.reset_prog_mode()
+            self.stdscr.refresh()
+            return
+        except curses.error:
+            pass
+        # Fallback: full re-initialization
+        self.stdscr = curses.initscr()
+        curses.noecho()
+        curses.cbreak()
+        self.stdscr.keypad(True)
+        self.stdscr.leaveok(True)
+        curses.curs_set(0)
+        curses.def_prog_mode()
+
+
     def create_archive(self, format_type):
         """Collect selected files and call the appropriate command or git logic."""
-        # Use the updated get_selected_paths which returns relative file paths
-        selected_files_rel = self.root_node.get_selected_paths(self.start_path)
+        # Selected files are tracked as they are toggled; map them to paths relative to start_path.
+        # The order is toggle order (a re-selected file moves to the end), so tar members follow it, not tree order
+        selected_files_rel = [node.rel_path_str for node in self.root_node.selected_files]
 
         if not selected_files_rel:
             self.status = "No files selected. Press Q to quit or select files."
@@ -562,10 +683,10 @@ class TarTUI:
                 cmd_base = ['tar', '-cf']
             elif format_type == 'gz':
                 extension = 'tar.gz'
-                cmd_base = ['tar', '-czf']
+                cmd_base = ['tar'] + _compressor_args('gz') + ['-cf']
             elif format_type == 'zst':
                 extension = 'tar.zst'
-                cmd_base = ['tar', '--zstd', '-cf']
+                cmd_base = ['tar'] + _compressor_args('zst', self.max_compress) + ['-cf']
             elif format_type == 'patch':
                 extension = 'patch'
                 # No cmd_base here, logic is handled separately
@@ -590,111 +711,155 @@ class TarTUI:
             print(f"Selected {len(selected_files_rel)} file item(s).")
 
             if format_type == 'patch':
-                print("Generating patch using temporary git repository...")
-                print(f"Working Directory: {self.initial_cwd}")
-                print("-" * 20)
-
-                # Use a context manager for the temporary directory
-                temp_dir_obj = tempfile.TemporaryDirectory(prefix="tartui_patch_")
-                temp_dir_path = Path(temp_dir_obj.name)
-
-                try:
-                    # 1. Copy selected files to temp dir, preserving structure
-                    print(f"Copying files to temporary directory: {temp_dir_path}")
-                    copy_errors = 0
-                    for rel_path_str in selected_files_rel:
-                        src_path = self.start_path / rel_path_str
-                        dest_path = temp_dir_path / rel_path_str
+                # Only regular files end up in the diff; one stat each gives both the filter and the staging size
+                patch_files_rel = []
+                patch_bytes = 0
+                for rel_path_str in selected_files_rel:
+                    try:
+                        st = os.stat(os.path.join(self.start_path, rel_path_str))
+                    except OSError:
+                        continue
+                    if stat.S_ISREG(st.st_mode):
+                        patch_files_rel.append(rel_path_str)
+                        patch_bytes += st.st_size
+
+                if not patch_files_rel:
+                    print("Error: None of the selected items is a regular file; nothing to diff.", file=sys.stderr)
+                    success = False
+                else:
+                    print("Generating patch using git diff --no-index...")
+                    print(f"Working Directory: {self.initial_cwd}")
+                    print("-" * 20)
+
+                    # Use a context manager for the temporary directory
+                    temp_dir_obj = tempfile.TemporaryDirectory(prefix="tartui_patch_",
+                                                               dir=_staging_parent(self.start_path, patch_bytes))
+                    temp_dir_path = Path(temp_dir_obj.name)
+                    # Diff an empty tree 'a' against the staged selection 'b'; no repo or index needed
+                    empty_dir_path = temp_dir_path / 'a'
+                    staged_dir_path = temp_dir_path / 'b'
 
-                        if src_path.is_file(): # Ensure it's a file before copying
+                    try:
+                        # 1. Copy selected files to the staging dir, preserving structure
+                        print(f"Copying files to temporary directory: {temp_dir_path}")
+                        empty_dir_path.mkdir()
+                        staged_dir_path.mkdir()
+                        # Create the directory structure first so worker threads don't race on mkdir;
+                        # one makedirs per unique parent rather than one per file
+                        created_dirs = set()
+                        for rel_path_str in patch_files_rel:
+                            parent_str = os.path.dirname(os.path.join(staged_dir_path, rel_path_str))
+                            if parent_str not in created_dirs:
+                                try:
+                                    os.makedirs(parent_str, exist_ok=True)
+                                except OSError:
+                                    pass # Reported by the copy of the affected file
+                                created_dirs.add(parent_str)
+
+                        def copy_one(rel_path_str):
+                            """Stage one file; returns the error, or None on success."""
+                            src_path = self.start_path / rel_path_str
+                            dest_path = staged_dir_path / rel_path_str
                             try:
-                                dest_path.parent.mkdir(parents=True, exist_ok=True)
-                                shutil.copy2(src_path, dest_path) # copy2 preserves metadata
+                                try:
+                                    # Hardlink when possible: git only reads the content, so no data copy is needed
+                                    os.link(src_path, dest_path)
+                                except OSError:
+                                    # Cross-device or unsupported filesystem
+                                    _fast_copy(src_path, dest_path)
                             except Exception as copy_err:
-                                print(f"  Error copying {rel_path_str}: {copy_err}", file=sys.stderr)
-                                copy_errors += 1
-                        # else: skip directories themselves, only copy files listed
-
-                    if copy_errors > 0:
-                         print(f"Warning: {copy_errors} errors occurred during file copying.", file=sys.stderr)
-                         # Optionally ask user if they want to proceed? For now, continue.
-
-                    # 2. Initialize git repo in temp dir
-                    print("Initializing git repository...")
-                    git_init_cmd = ['git', 'init']
-                    init_proc = subprocess.run(git_init_cmd, cwd=temp_dir_path, capture_output=True, text=True, check=False)
-                    if init_proc.returncode != 0:
-                         print(f"  Error initializing git: {init_proc.stderr}", file=sys.stderr)
-                         raise RuntimeError("git init failed")
-                    # Suppress common "hint:" messages from git init if desired
-                    # print(init_proc.stdout) # Usually just says initialized empty repo
-
-                    # 3. Add all files
-                    print("Adding files to git index...")
-                    git_add_cmd = ['git', 'add', '.']
-                    add_proc = subprocess.run(git_add_cmd, cwd=temp_dir_path, capture_output=True, text=True, check=False)
-                    if add_proc.returncode != 0:
-                        print(f"  Error adding files to git: {add_proc.stderr}", file=sys.stderr)
-                        # might happen if e.g. file permissions changed or file disappeared
-                        raise RuntimeError("git add failed")
-
-                    # 4. Generate diff
-                    print("Generating patch (git diff --cached)...")
-                    # Use --no-color explicitly if needed, though capture_output usually prevents it
-                    git_diff_cmd = ['git', 'diff', '--cached', '--no-color']
-                    diff_proc = subprocess.run(git_diff_cmd, cwd=temp_dir_path, capture_output=True, text=True, check=False)
-
-                    # diff --cached returns 0 if no changes staged (shouldn't happen here unless no files selected/copied),
-                    # or 0 if successful and there are staged changes. Non-zero indicates an error.
-                    if diff_proc.returncode != 0:
-                         print(f"  Error generating git diff: {diff_proc.stderr}", file=sys.stderr)
-                         raise RuntimeError("git diff failed")
-
-                    # 5. Write patch to file
-                    patch_content = diff_proc.stdout
-                    output_path_abs = self.initial_cwd / output_filename
-                    print(f"Writing patch to {output_path_abs}...")
-                    try:
-                         with open(output_path_abs, 'w') as f:
-                            f.write(patch_content)
-                         print(f"\nSuccessfully created patch '{output_filename}'")
-                         success = True
-                    except IOError as e:
-                         print(f"\nError writing patch file '{output_path_abs}': {e}", file=sys.stderr)
-                         success = False
-
-                except FileNotFoundError:
-                    print("\nError: 'git' command not found. Is git installed and in your PATH?", file=sys.stderr)
-                    success = False
-                except Exception as patch_err:
-                    print(f"\nAn error occurred during patch generation: {patch_err}", file=sys.stderr)
-                    success = False
-                finally:
-                    # TemporaryDirectory context manager handles cleanup on exit/error
-                    print(f"Cleaning up temporary directory: {temp_dir_path}")
-                    # temp_dir_obj.cleanup() # This is called automatically by context manager
+                                return copy_err
+                            return None
+
+                        # Per-file syscalls overlap well across threads (the GIL is released during I/O)
+                        copy_errors = 0
+                        max_workers = min(32, (os.cpu_count() or 1) * 4)
+                        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                            for rel_path_str, copy_err in zip(patch_files_rel, executor.map(copy_one, patch_files_rel)):
+                                if copy_err is not None:
+                                    print(f"  Error copying {rel_path_str}: {copy_err}", file=sys.stderr)
+                                    copy_errors += 1
+
+                        if copy_errors > 0:
+                             print(f"Warning: {copy_errors} errors occurred during file copying.", file=sys.stderr)
+                             # Optionally ask user if they want to proceed? For now, continue.
+
+                        # 2. Generate diff, streamed by git into a temp file next to the patch. The target is only
+                        # replaced once git succeeds: truncating it first would also empty a staged hardlink of it,
+                        # and a failed run must not cost an existing patch of the same name
+                        output_path_abs = self.initial_cwd / output_filename
+                        print(f"Generating patch (git diff --no-index) into {output_path_abs}...")
+                        # --no-prefix with the staging dir named 'b' yields 'b/<path>' names, which apply with -p1
+                        git_diff_cmd = ['git', '--no-pager', 'diff', '--no-index', '--no-prefix', '--binary', '--no-color',
+                                        empty_dir_path.name, staged_dir_path.name]
+                        try:
+                             out = tempfile.NamedTemporaryFile(dir=output_path_abs.parent, prefix=f".{output_path_abs.name}.",
+                                                               suffix=".tmp", delete=False)
+                        except OSError as e:
+                             # Reported once, by the handler below
+                             raise RuntimeError(f"cannot write patch file '{output_path_abs}': {e}")
+                        tmp_patch_path = Path(out.name)
+                        try:
+                             with out:
+                                # Same permissions a plain open() would give, not mkstemp's 0600
+                                umask = os.umask(0)
+                                os.umask(umask)
+                                os.fchmod(out.fileno(), 0o666 & ~umask)
+                                diff_proc = subprocess.run(git_diff_cmd, cwd=temp_dir_path, stdout=out,
+                                                           stderr=subprocess.PIPE, check=False)
+
+                             # --no-index exits 1 when differences are found (the normal case), 0 if there are none.
+                             # Anything else indicates an error.
+                             if diff_proc.returncode not in (0, 1):
+                                  print(f"  Error generating git diff: {diff_proc.stderr.decode(errors='replace')}", file=sys.stderr)
+                                  raise RuntimeError("git diff failed")
+                             os.replace(tmp_patch_path, output_path_abs)
+                        finally:
+                             # Already gone after a successful replace; otherwise drop the failed attempt
+                             tmp_patch_path.unlink(missing_ok=True)
+
+                        print(f"\nSuccessfully created patch '{output_filename}'")
+                        success = True
+
+                    except FileNotFoundError:
+                        print("\nError: 'git' command not found. Is git installed and in your PATH?", file=sys.stderr)
+                        success = False
+                    except Exception as patch_err:
+                        print(f"\nAn error occurred during patch generation: {patch_err}", file=sys.stderr)
+                        success = False
+                    finally:
+                        # TemporaryDirectory context manager handles cleanup on exit/error
+                        print(f"Cleaning up temporary directory: {temp_dir_path}")
+                        # temp_dir_obj.cleanup() # This is called automatically by context manager
 
             else: # tar, gz, zst
-                cmd = cmd_base + [output_filename] + selected_files_rel
-                print(f"Running command:")
-                try:
-                    print(f"$ {shlex.join(cmd)}")
-                except AttributeError: # Fallback for older python
-                    print(' '.join(shlex.quote(arg) for arg in cmd))
+                # File list goes through stdin (NUL-separated) to stay clear of ARG_MAX
+                cmd = cmd_base + [output_filename, '--null', '--files-from=-']
+                if self.verbose:
+                    cmd.insert(1, '-v')
+                print(f"Running command ({len(selected_files_rel)} path(s) on stdin):")
+                print(f"$ {shlex.join(cmd)}")
                 print(f"Working Directory: {self.initial_cwd}")
                 print("-" * 20)
 
                 # Run the tar command relative to the original start directory
-                process = subprocess.run(cmd, check=False, capture_output=True, text=True, cwd=self.start_path) # Run tar from where paths are relative
+                # Raw bytes both ways: names are passed through unchanged and tar's output is never decoded
+                file_list = b"\0".join(map(os.fsencode, selected_files_rel)) + b"\0"
+                # tar's stdout is only the -v listing; discard it unless asked, keep stderr for errors
+                process = subprocess.run(cmd, input=file_list, check=False, cwd=self.start_path, # Run tar from where paths are relative
+                                         stdout=subprocess.PIPE if self.verbose else subprocess.DEVNULL,
+                                         stderr=subprocess.PIPE)
 
                 if process.stdout:
-                    print("Command Output:")
-                    print(process.stdout)
+                    print("Command Output:", flush=True)
+                    sys.stdout.buffer.write(process.stdout + b"\n")
+                    sys.stdout.buffer.flush()
                 if process.stderr:
                     # Suppress common, non-fatal tar message "Removing leading `../` from member names" or similar
                     # Let's show stderr for tar as it might contain important info
-                    print("Command Error Output:", file=sys.stderr)
-                    print(process.stderr, file=sys.stderr)
+                    print("Command Error Output:", file=sys.stderr, flush=True)
+                    sys.stderr.buffer.write(process.stderr + b"\n")
+                    sys.stderr.buffer.flush()
 
                 if process.returncode == 0:
                     print(f"\nSuccessfully created '{output_filename}'")
@@ -713,23 +878,13 @@ class TarTUI:
             success = False
         except Exception as e:
             print(f"\nAn unexpected error occurred during command execution: {e}", file=sys.stderr)
-            import traceback
             traceback.print_exc()
             success = False
 
         print("=" * 20)
-        input("Press Enter to return to TUI...")
+        _wait_for_key("Press any key to return to TUI...")
 
-        # Re-initialize curses screen (necessary after endwin)
-        self.stdscr = curses.initscr()
-        curses.noecho()
-        curses.cbreak()
-        self.stdscr.keypad(True)
-        curses.curs_set(0)
-        try: # Re-initialize colors if used
-             curses.start_color()
-             curses.use_default_colors()
-        except: pass
+        self._restore_curses()
 
         if success:
              self.status = f"Successfully created '{output_filename}'. Press Q to quit."
@@ -740,14 +895,16 @@ class TarTUI:
 
 
 # --- Main Execution ---
-def main(stdscr, start_path, include_parent_path):
-    try:
-        curses.start_color()
-        curses.use_default_colors()
-    except: pass
+def main(stdscr, start_path, include_parent_path, verbose=False, max_compress=False):
+    # Colors are set up once here; returning from external commands no longer re-initializes them
+    if curses.has_colors():
+        try:
+            curses.start_color()
+            curses.use_default_colors()
+        except curses.error: pass
 
     try:
-        app = TarTUI(stdscr, start_path, include_parent_path)
+        app = TarTUI(stdscr, start_path, include_parent_path, verbose, max_compress)
         app.run()
     except ValueError as e:
          if curses.isendwin():
@@ -760,7 +917,6 @@ def main(stdscr, start_path, include_parent_path):
         if not curses.isendwin():
             curses.endwin()
         print(f"\nAn unexpected error occurred in the TUI: {e}", file=sys.stderr)
-        import traceback
         traceback.print_exc()
         sys.exit(1)
         
@@ -778,32 +934,40 @@ def main_cli():
         action="store_true",
         help="Display full relative path for files inside subdirectories instead of just the filename. Affects display only."
     )
+    parser.add_argument(
+        "-v", "--verbose",
+        action="store_true",
+        help="Show the list of files tar adds when creating archives."
+    )
+    parser.add_argument(
+        "--max-compress",
+        action="store_true",
+        help="Compress .tar.zst with 'zstd -T0 --long=27 -19': smaller archives, much slower, ~256 MB RAM per zstd worker."
+    )
 
     args = parser.parse_args()
 
-    # Resolve start_dir relative to the *current* working directory
+    # Anchor start_dir at the *current* working directory; TarTUI resolves it once itself,
+    # so a single stat covers both the existence and the directory check here
     start_directory = Path(args.start_dir)
+    start_path = start_directory if start_directory.is_absolute() else Path.cwd() / start_directory
     try:
-        resolved_start_dir = start_directory.resolve()
+        st = os.stat(start_path)
     except FileNotFoundError:
          print(f"Error: Starting path '{args.start_dir}' does not exist.", file=sys.stderr)
          sys.exit(1)
-    except Exception as e:
-         print(f"Error resolving starting path '{args.start_dir}': {e}", file=sys.stderr)
+    except OSError as e:
+         print(f"Error accessing starting path '{args.start_dir}': {e}", file=sys.stderr)
          sys.exit(1)
 
-
-    if not resolved_start_dir.exists():
-        print(f"Error: Starting path '{args.start_dir}' (resolved to '{resolved_start_dir}') does not exist.", file=sys.stderr)
-        sys.exit(1)
-    if not resolved_start_dir.is_dir():
-         print(f"Error: Starting path '{args.start_dir}' (resolved to '{resolved_start_dir}') is not a directory.", file=sys.stderr)
+    if not stat.S_ISDIR(st.st_mode):
+         print(f"Error: Starting path '{args.start_dir}' (as '{start_path}') is not a directory.", file=sys.stderr)
          sys.exit(1)
 
     # Use curses.wrapper for safety
     try:
-        # Pass the *resolved* absolute path to the main function
-        curses.wrapper(main, resolved_start_dir, args.full_path_display)
+        # Pass the absolute path to the main function
+        curses.wrapper(main, start_path, args.full_path_display, args.verbose, args.max_compress)
     except KeyboardInterrupt:
         print("\nInterrupted by user.")
     except Exception as e:
@@ -812,7 +976,6 @@ def main_cli():
               try: curses.endwin()
               except: pass # Ignore errors during final endwin attempt
          print(f"\nAn unhandled error occurred: {e}", file=sys.stderr)
-         import traceback
          traceback.print_exc()
          sys.exit(1)
 